@@ -8,65 +8,53 @@ from reportlab.pdfgen import canvas
 from reportlab.lib import colors
 from reportlab.lib.units import inch
 from reportlab.platypus import Paragraph
-from reportlab.lib.styles import getSampleStyleSheet
-from PIL import Image, ImageDraw
-from gtts import gTTS
+from PIL import ImageDraw
 import base64
+import uuid
 from io import BytesIO
 import streamlit.components.v1 as components
-
-# Sample excuse templates
-EXCUSES = {
-    "work": [
-        "I have a sudden family emergency that requires my immediate attention.",
-        "I'm unwell and need to visit a doctor today.",
-        "My car broke down, and I'm waiting for roadside assistance."
-    ],
-    "school": [
-        "I missed the bus and won't make it to class on time.",
-        "I had a medical appointment that ran longer than expected.",
-        "I was helping a family member with an urgent matter."
-    ],
-    "social": [
-        "I got caught up with some unexpected work and can't make it.",
-        "I'm feeling under the weather and need to rest.",
-        "A last-minute family obligation came up."
-    ],
-    "family": [
-        "I have to attend an urgent appointment.",
-        "I'm dealing with a personal issue that needs my attention.",
-        "I got delayed due to transportation issues."
-    ]
-}
-
-# Apology templates
-APOLOGIES = {
-    "professional": "I sincerely apologize for any inconvenience caused. Please let me know how I can make this right.",
-    "emotional": "I'm so sorry for letting you down. I feel terrible about this and hope you understand."
+from speech import SegmentCache, get_backend, synthesize_speech
+from memory import SessionMemory, SessionRegistry
+from perf import RerunStats, RerunTimer, is_fragment_rerun, track_fragment
+from recommender import ExcuseRecommender
+from corpus import CorpusStore
+from resources import get_chat_font, get_chat_template, get_paragraph_style, warm_speech, warm_up
+
+# Prefixes prepended to excuses by urgency
+URGENCY_PREFIXES = {
+    "high": "Urgent: ",
+    "low": "Just a heads-up: "
 }
 
 class ExcuseGenerator:
-    def __init__(self):
+    def __init__(self, corpus=None, speech_cache=None, speech_backend=None, recommender=None, user_id=None):
+        # Shared, process-wide resources; the rest of the generator is this user's mutable state
+        self.corpus = corpus if corpus is not None else CorpusStore()
         self.history = []
         self.favorites = []
         self.ratings = {}  # Dictionary to store ratings for excuses
-
-    def generate_excuse(self, scenario, urgency="medium", custom_excuse=None):
-        """Generate a context-based excuse."""
+        self.recommender = recommender  # Shared across users; None disables "recommended" mode
+        self.user_id = user_id or uuid.uuid4().hex
+        self.speech_cache = speech_cache if speech_cache is not None else SegmentCache()
+        self.speech_backend = speech_backend if speech_backend is not None else get_backend()
+        self.last_speech_stats = None
+
+    def generate_excuse(self, scenario, urgency="medium", custom_excuse=None, mode="random", snapshot=None):
+        """Generate a context-based excuse, at random or recommended from other users' ratings."""
+        excuses = (snapshot or self.corpus.snapshot).excuses
         scenario = scenario.lower()
         urgency = urgency.lower()
-        if scenario not in EXCUSES:
-            scenario = "social"
+        if scenario not in excuses:
+            scenario = "social" if "social" in excuses else next(iter(excuses))
         if urgency not in ["low", "medium", "high"]:
             urgency = "medium"
         if custom_excuse and custom_excuse.strip():
             excuse = custom_excuse
+        elif mode == "recommended" and self.recommender is not None:
+            excuse = self.recommender.choose(self.user_id, scenario) or random.choice(excuses[scenario])
         else:
-            excuse = random.choice(EXCUSES[scenario])
-        if urgency == "high":
-            excuse = f"Urgent: {excuse}"
-        elif urgency == "low":
-            excuse = f"Just a heads-up: {excuse}"
+            excuse = random.choice(excuses[scenario])
+        excuse = URGENCY_PREFIXES.get(urgency, "") + excuse
         self.history.append({"scenario": scenario, "excuse": excuse, "timestamp": str(datetime.now())})
         return excuse
 
@@ -101,8 +89,7 @@ class ExcuseGenerator:
                 c.drawString(1*inch, 8.7*inch, f"Reason for Absence: {excuse}")
 
                 # Medical Details
-                styles = getSampleStyleSheet()
-                style = styles["Normal"]
+                style = get_paragraph_style("Normal")
                 medical_text = (
                     f"This is to certify that {patient_name or 'the patient'} has been examined and diagnosed "
                     "with a temporary medical condition requiring rest. The patient is advised to refrain from "
@@ -142,9 +129,9 @@ class ExcuseGenerator:
 
             elif proof_type == "chat":
                 filename = f"chat_screenshot_{timestamp}.png"
-                img = Image.new('RGB', (400, 600), color='white')
+                img = get_chat_template().copy()
                 draw = ImageDraw.Draw(img)
-                draw.text((10, 10), f"Friend: Sorry, {excuse}", fill='black')
+                draw.text((10, 10), f"Friend: Sorry, {excuse}", fill='black', font=get_chat_font())
                 img.save(filename)
                 return filename, None
 
@@ -152,10 +139,11 @@ class ExcuseGenerator:
             return None, f"Error generating proof: {str(e)}"
         return None, "Unknown error in proof generation."
 
-    def generate_apology(self, tone="professional"):
+    def generate_apology(self, tone="professional", snapshot=None):
         """Generate an apology based on tone."""
+        apologies = (snapshot or self.corpus.snapshot).apologies
         tone = tone.lower()
-        return APOLOGIES.get(tone, APOLOGIES["professional"])
+        return apologies.get(tone, apologies.get("professional", next(iter(apologies.values()))))
 
     def save_to_favorites(self, excuse):
         """Save an excuse to favorites."""
@@ -175,13 +163,20 @@ class ExcuseGenerator:
             return f"Based on past usage, you might need an excuse for {last_excuse['scenario']} soon."
         return "No history available to predict."
 
-    def generate_speech(self, text, lang="en"):
-        """Convert text excuse to speech."""
+    def generate_speech(self, text, lang="en", on_chunk=None):
+        """Convert text excuse to speech from cached, frame-spliced segments."""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"excuse_speech_{timestamp}.mp3"
         try:
-            tts = gTTS(text=text, lang=lang)
-            tts.save(filename)
+            audio, stats = synthesize_speech(
+                text, lang, self.speech_cache, backend=self.speech_backend,
+                prefixes=tuple(URGENCY_PREFIXES.values()), on_chunk=on_chunk
+            )
+            if not audio:
+                return None, "Error generating speech: no audio frames produced."
+            with open(filename, 'wb') as f:
+                f.write(audio)
+            self.last_speech_stats = stats
             return filename, None
         except Exception as e:
             return None, f"Error generating speech: {str(e)}"
@@ -191,6 +186,8 @@ class ExcuseGenerator:
         if excuse not in self.ratings:
             self.ratings[excuse] = []
         self.ratings[excuse].append(rating)
+        if self.recommender is not None:
+            self.recommender.record(self.user_id, excuse, rating)
 
     def get_average_rating(self, excuse):
         """Calculate the average rating for an excuse."""
@@ -198,6 +195,13 @@ class ExcuseGenerator:
             return sum(self.ratings[excuse]) / len(self.ratings[excuse])
         return None
 
+# Rerun time and bytes sent, for full-script runs and fragment-only runs
+@st.cache_resource
+def get_rerun_stats():
+    return RerunStats()
+
+app_rerun = RerunTimer(get_rerun_stats(), "full_app").start()
+
 # Custom CSS for styling, animations, background, and dark mode
 st.markdown("""
     <style>
@@ -446,91 +450,114 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+# Speech segments are shared by every session in the process
+@st.cache_resource
+def get_speech_cache():
+    return SegmentCache()
+
+# Speech backend client, shared by every session
+@st.cache_resource
+def get_speech_backend():
+    return get_backend()
+
+# Excuses, apologies and themes, hot-reloaded from config/ when the files change
+@st.cache_resource
+def get_corpus_store():
+    return CorpusStore().watch()
+
+# Collaborative-filtering recommender fed by every session's ratings
+@st.cache_resource
+def get_recommender():
+    store = get_corpus_store()
+    recommender = ExcuseRecommender(store.snapshot.excuses, prefixes=tuple(URGENCY_PREFIXES.values()))
+    store.subscribe(lambda snapshot: recommender.update_corpus(snapshot.excuses))
+    get_session_registry().track_shared("recommender", recommender.footprint)
+    return recommender
+
+# Memory accounting and idle-session slimming across every session in the process
+@st.cache_resource
+def get_session_registry():
+    return SessionRegistry()
+
+# Build shared assets and run first-use code paths once per process, so a
+# session's first request costs the same as its hundredth. Corpus reloads
+# re-warm speech, so newly added excuses are not synthesized on first use.
+@st.cache_resource
+def warm_up_process():
+    store = get_corpus_store()
+    speech_cache, backend = get_speech_cache(), get_speech_backend()
+    prefixes = tuple(URGENCY_PREFIXES.values())
+    store.subscribe(lambda snapshot: warm_speech(speech_cache, snapshot, backend, prefixes))
+    return warm_up(speech_cache, store.snapshot, backend, prefixes=prefixes)
+
+warm_up_timings = warm_up_process()
+
+# The corpus snapshot this rerun works with, even if a reload lands mid-run
+snapshot = get_corpus_store().snapshot
+
+def rerun_snapshot():
+    """Return the snapshot for the current run; fragment-only reruns start from the latest one."""
+    return get_corpus_store().snapshot if is_fragment_rerun() else snapshot
+
 # Initialize session state
 if 'dark_mode' not in st.session_state:
     st.session_state.dark_mode = False
 if 'generator' not in st.session_state:
-    st.session_state.generator = ExcuseGenerator()
-if 'temp_files' not in st.session_state:
-    st.session_state.temp_files = []
+    st.session_state.generator = ExcuseGenerator(
+        corpus=get_corpus_store(), speech_cache=get_speech_cache(),
+        speech_backend=get_speech_backend(), recommender=get_recommender()
+    )
+if 'memory' not in st.session_state:
+    st.session_state.memory = SessionMemory(st.session_state.generator)
+    get_session_registry().register(st.session_state.memory)
 if 'theme' not in st.session_state:
     st.session_state.theme = "space"
+if 'theme_selector' not in st.session_state:
+    st.session_state.theme_selector = st.session_state.theme
 if 'last_excuse' not in st.session_state:
     st.session_state.last_excuse = ""
+if 'current_excuse' not in st.session_state:
+    st.session_state.current_excuse = ""
 if 'accent_color' not in st.session_state:
     st.session_state.accent_color = "#ff2d55"
-if 'background_image' not in st.session_state:
-    st.session_state.background_image = None
-
-# Themes for selection and random switcher
-THEMES = {
-    "space": "url('https://www.transparenttextures.com/patterns/stardust.png'), linear-gradient(135deg, #1a1a3d, #3d2b56)",
-    "gradient": "linear-gradient(135deg, #ff6b6b, #feca57, #48dbfb)",
-    "nature": "url('https://www.transparenttextures.com/patterns/leaf.png'), linear-gradient(135deg, #2ecc71, #27ae60)",
-    "neon": "url('https://www.transparenttextures.com/patterns/dark-mosaic.png'), linear-gradient(135deg, #1c2526, #2f4858)",
-    "ocean": "url('https://www.transparenttextures.com/patterns/wave.png'), linear-gradient(135deg, #0077b6, #00b4d8)",
-    "sunset": "url('https://www.transparenttextures.com/patterns/sunset.png'), linear-gradient(135deg, #ff5e62, #feca57)",
-    "dark_space": "url('https://www.transparenttextures.com/patterns/stardust.png'), linear-gradient(135deg, #0f0f23, #2b1a3d)",
-    "dark_gradient": "linear-gradient(135deg, #d63031, #e17055, #2d3436)",
-    "dark_nature": "url('https://www.transparenttextures.com/patterns/leaf.png'), linear-gradient(135deg, #1a7f37, #14532d)",
-    "dark_neon": "url('https://www.transparenttextures.com/patterns/dark-mosaic.png'), linear-gradient(135deg, #0b1415, #1f2e38)",
-    "dark_ocean": "url('https://www.transparenttextures.com/patterns/wave.png'), linear-gradient(135deg, #003f5c, #005f73)",
-    "dark_sunset": "url('https://www.transparenttextures.com/patterns/sunset.png'), linear-gradient(135deg, #ff3f34, #ff9f43)"
-}
 
-# Apply custom accent color
-accent_color = st.session_state.accent_color
-st.markdown(
-    f"""
-    <style>
-    .main-title, .toggle-button, .stButton>button {{
-        color: {accent_color} !important;
-        border-color: {accent_color} !important;
-    }}
-    .toggle-button, .stButton>button {{
-        background: linear-gradient(145deg, {accent_color}, #0ff) !important;
-    }}
-    .toggle-button:hover, .stButton>button:hover {{
-        background: linear-gradient(145deg, #0ff, {accent_color}) !important;
-    }}
-    .toggle-button {{
-        box-shadow: 0 0 10px {accent_color} !important;
-    }}
-    .toggle-button:hover {{
-        box-shadow: 0 0 15px {accent_color} !important;
-    }}
-    .output-box, .stTextInput>div>input, .stSelectbox>div>select {{
-        border-color: {accent_color} !important;
-    }}
-    </style>
-    """,
-    unsafe_allow_html=True
-)
+# Restore anything spilled while the session was idle and enforce memory caps.
+# Fragment-only reruns skip this, so track_fragment calls it for them as well.
+def touch_session_memory():
+    st.session_state.memory.touch()
+
+touch_session_memory()
+
+# Custom background image (a fragment, so uploads don't rerun the whole app)
+@st.fragment
+@track_fragment("background", get_rerun_stats, touch_session_memory)
+def background_panel():
+    uploaded_file = st.file_uploader("Upload a custom background image:", type=["jpg", "png", "jpeg"])
+    if uploaded_file is not None and uploaded_file.file_id != st.session_state.memory.background_id:
+        if not st.session_state.memory.set_background(uploaded_file.getvalue(), uploaded_file.file_id):
+            st.warning("Background image is too large, even after downscaling.")
+    if st.session_state.memory.background:
+        encoded_image = base64.b64encode(st.session_state.memory.background).decode()
+        # "body .stApp" outranks the theme panel's ".stApp" rule
+        st.markdown(
+            f"""
+            <style>
+            body .stApp {{
+                background: url(data:image/png;base64,{encoded_image}) !important;
+                background-size: cover !important;
+                background-attachment: fixed !important;
+            }}
+            body .dark-mode .stApp {{
+                background: url(data:image/png;base64,{encoded_image}) !important;
+                background-size: cover !important;
+                background-attachment: fixed !important;
+            }}
+            </style>
+            """,
+            unsafe_allow_html=True
+        )
 
-# Custom background image
-uploaded_file = st.file_uploader("Upload a custom background image:", type=["jpg", "png", "jpeg"])
-if uploaded_file is not None:
-    st.session_state.background_image = uploaded_file
-if st.session_state.background_image:
-    image_bytes = st.session_state.background_image.read()
-    encoded_image = base64.b64encode(image_bytes).decode()
-    st.markdown(
-        f"""
-        <style>
-        .stApp {{
-            background: url(data:image/png;base64,{encoded_image}) !important;
-            background-size: cover !important;
-            background-attachment: fixed !important;
-        }}
-        .dark-mode .stApp {{
-            background: url(data:image/png;base64,{encoded_image}) !important;
-            background-size: cover !important;
-            background-attachment: fixed !important;
-        }}
-        </style>
-        """,
-        unsafe_allow_html=True
-    )
+background_panel()
 
 # Sound effects JavaScript
 components.html("""
@@ -574,26 +601,10 @@ components.html("""
 """, height=0)
 
 # Theme selection and random switcher
-def apply_theme(theme_name):
+def apply_theme(theme_name, snapshot):
     st.session_state.theme = theme_name
-    if not st.session_state.background_image:  # Only apply theme if no custom background
-        st.markdown(
-            f"""
-            <style>
-            .stApp {{
-                background: {THEMES[theme_name]} !important;
-                background-size: cover, 200% !important;
-                background-attachment: fixed !important;
-            }}
-            .dark-mode .stApp {{
-                background: {THEMES.get('dark_' + theme_name.split('_')[-1], THEMES[theme_name])} !important;
-                background-size: cover, 200% !important;
-                background-attachment: fixed !important;
-            }}
-            </style>
-            """,
-            unsafe_allow_html=True
-        )
+    if not st.session_state.memory.background:  # Only apply theme if no custom background
+        st.markdown(snapshot.theme_css[theme_name], unsafe_allow_html=True)
 
 # Live clock JavaScript
 components.html("""
@@ -609,26 +620,68 @@ components.html("""
     </script>
 """, height=50)
 
-# Theme selector and color picker
-col1, col2 = st.columns([1, 1])
-with col1:
-    selected_theme = st.selectbox("Select Theme:", list(THEMES.keys()), index=list(THEMES.keys()).index(st.session_state.theme), key="theme_selector")
-    if selected_theme != st.session_state.theme:
-        apply_theme(selected_theme)
-with col2:
-    new_accent_color = st.color_picker("Pick Accent Color:", value=st.session_state.accent_color, key="accent_color_picker")
-    if new_accent_color != st.session_state.accent_color:
-        st.session_state.accent_color = new_accent_color
-
-# Random theme switcher
-if st.button("🎨 Random Theme", key="theme_switcher", type="primary"):
-    available_themes = list(THEMES.keys())
-    current_theme = st.session_state.theme
-    available_themes.remove(current_theme)
+# Theme selector, color picker and random switcher; the theme and accent CSS live
+# inside the fragment so changing them reruns only this panel
+def randomize_theme():
+    available_themes = [name for name in get_corpus_store().snapshot.themes if name != st.session_state.theme]
+    if not available_themes:  # A reload left only the current theme
+        return
     new_theme = random.choice(available_themes)
-    apply_theme(new_theme)
-st.markdown('<style>.stButton>button[key="theme_switcher"] { background: linear-gradient(145deg, #39ff14, #ff2d55); } .stButton>button[key="theme_switcher"]:hover { background: linear-gradient(145deg, #ff2d55, #39ff14); transform: scale(1.05); }</style>', unsafe_allow_html=True)
-components.html("<script>document.querySelector('button[key=\"theme_switcher\"]').addEventListener('click', playClickSound); document.querySelector('button[key=\"theme_switcher\"]').addEventListener('mouseover', playHoverSound);</script>", height=0)
+    st.session_state.theme = new_theme
+    st.session_state.theme_selector = new_theme
+
+@st.fragment
+@track_fragment("appearance", get_rerun_stats, touch_session_memory)
+def appearance_panel():
+    snapshot = rerun_snapshot()
+    if st.session_state.theme_selector not in snapshot.themes:  # Theme removed by a config reload
+        st.session_state.theme_selector = next(iter(snapshot.themes))
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        selected_theme = st.selectbox("Select Theme:", list(snapshot.themes), key="theme_selector")
+    with col2:
+        new_accent_color = st.color_picker("Pick Accent Color:", value=st.session_state.accent_color, key="accent_color_picker")
+        if new_accent_color != st.session_state.accent_color:
+            st.session_state.accent_color = new_accent_color
+
+    # Random theme switcher
+    st.button("🎨 Random Theme", key="theme_switcher", type="primary", on_click=randomize_theme,
+              disabled=len(snapshot.themes) < 2)
+    st.markdown('<style>.stButton>button[key="theme_switcher"] { background: linear-gradient(145deg, #39ff14, #ff2d55); } .stButton>button[key="theme_switcher"]:hover { background: linear-gradient(145deg, #ff2d55, #39ff14); transform: scale(1.05); }</style>', unsafe_allow_html=True)
+    components.html("<script>document.querySelector('button[key=\"theme_switcher\"]').addEventListener('click', playClickSound); document.querySelector('button[key=\"theme_switcher\"]').addEventListener('mouseover', playHoverSound);</script>", height=0)
+
+    apply_theme(selected_theme, snapshot)
+
+    # Apply custom accent color
+    accent_color = st.session_state.accent_color
+    st.markdown(
+        f"""
+        <style>
+        .main-title, .toggle-button, .stButton>button {{
+            color: {accent_color} !important;
+            border-color: {accent_color} !important;
+        }}
+        .toggle-button, .stButton>button {{
+            background: linear-gradient(145deg, {accent_color}, #0ff) !important;
+        }}
+        .toggle-button:hover, .stButton>button:hover {{
+            background: linear-gradient(145deg, #0ff, {accent_color}) !important;
+        }}
+        .toggle-button {{
+            box-shadow: 0 0 10px {accent_color} !important;
+        }}
+        .toggle-button:hover {{
+            box-shadow: 0 0 15px {accent_color} !important;
+        }}
+        .output-box, .stTextInput>div>input, .stSelectbox>div>select {{
+            border-color: {accent_color} !important;
+        }}
+        </style>
+        """,
+        unsafe_allow_html=True
+    )
+
+appearance_panel()
 
 # Dark mode toggle
 st.markdown('<div class="toggle-container">', unsafe_allow_html=True)
@@ -670,15 +723,26 @@ option = st.sidebar.selectbox(
     key="action_select"
 )
 
+# Memory usage for this session and the whole process
+with st.sidebar.expander("📊 Memory Usage"):
+    footprint = st.session_state.memory.footprint()
+    st.caption(f"This session: {footprint['total'] / 1024:.0f} KiB in memory, {footprint['spilled_to_disk'] / 1024:.0f} KiB spilled")
+    # Pod-wide totals come from the sweeper; computing them here would scan every session on every rerun
+    aggregate = get_session_registry().last_aggregate
+    if aggregate:
+        st.json(aggregate)
+    else:
+        st.caption("Pod-wide totals pending: the first sweep has not run yet.")
+
+# Rerun cost per scope: "full_app" is a whole-script rerun, "*_panel" a fragment-only rerun
+with st.sidebar.expander("⏱️ Rerun Stats"):
+    st.json(get_rerun_stats().summary())
+    st.caption("Process warm-up")
+    st.json(warm_up_timings)
+
 # Clean up temporary files
 def cleanup_temp_files():
-    for file in st.session_state.temp_files:
-        if os.path.exists(file):
-            try:
-                os.remove(file)
-            except:
-                pass
-    st.session_state.temp_files = []
+    st.session_state.memory.clear_temp_files()
 
 # Generate download link for files
 def get_binary_file_downloader_html(file_path, file_label):
@@ -686,9 +750,32 @@ def get_binary_file_downloader_html(file_path, file_label):
         data = f.read()
     b64 = base64.b64encode(data).decode()
     href = f'<a href="data:application/octet-stream;base64,{b64}" download="{os.path.basename(file_path)}">{file_label}</a>'
-    st.session_state.temp_files.append(file_path)
+    st.session_state.memory.add_temp_file(file_path)
     return href
 
+def queue_speech_chunk(audio, playback_id, index):
+    """Queue an MP3 chunk on the page's player; each chunk starts when the previous one ends."""
+    b64 = base64.b64encode(audio).decode()
+    components.html(f"""
+    <script>
+    const host = window.parent;
+    let queue = host.excuseSpeechQueue;
+    if (!queue || queue.id !== "{playback_id}") {{
+        if (queue && queue.current) queue.current.pause();
+        queue = host.excuseSpeechQueue = {{ id: "{playback_id}", clips: [], next: 0, current: null }};
+    }}
+    queue.clips[{index}] = "data:audio/mp3;base64,{b64}";
+    function playNext() {{
+        const src = queue.clips[queue.next];
+        if (queue.current || !src || host.excuseSpeechQueue !== queue) return;
+        queue.current = new host.Audio(src);
+        queue.current.onended = () => {{ queue.current = null; queue.next += 1; playNext(); }};
+        queue.current.play().catch(() => {{ queue.current = null; }});
+    }}
+    playNext();
+    </script>
+    """, height=0)
+
 # Share to clipboard JavaScript
 def share_to_clipboard(text):
     components.html(
@@ -707,33 +794,44 @@ def share_to_clipboard(text):
     )
     components.html("<script>document.querySelector('.share-button').addEventListener('mouseover', playHoverSound);</script>", height=0)
 
-# Main content based on selected option
-if option == "Generate Excuse":
+# Action panels; each is a fragment, so its widgets rerun only that panel
+@st.fragment
+@track_fragment("excuse_panel", get_rerun_stats, touch_session_memory)
+def excuse_panel():
     st.markdown('<div class="section-title">🎭 Generate Excuse</div>', unsafe_allow_html=True)
-    scenario = st.selectbox("Select scenario:", ["Work", "School", "Social", "Family"], key="excuse_scenario")
+    snapshot = rerun_snapshot()
+    scenario = st.selectbox("Select scenario:", snapshot.scenario_labels, key="excuse_scenario")
     urgency = st.selectbox("Select urgency:", ["Low", "Medium", "High"], key="excuse_urgency")
     custom_excuse = st.text_input("✏️ Or enter a custom excuse (optional):", key="custom_excuse")
+    mode = st.radio("Excuse source:", ["Random", "Recommended"], horizontal=True, key="excuse_mode",
+                    help="Recommended picks excuses that users with similar ratings liked.")
     if st.button("Generate Excuse 🚀"):
-        if not custom_excuse.strip() and not EXCUSES.get(scenario.lower()):
+        if not custom_excuse.strip() and not snapshot.excuses.get(scenario.lower()):
             st.error("Please select a valid scenario or enter a custom excuse.")
             components.html("<script>playErrorSound();</script>", height=0)
         else:
-            excuse = st.session_state.generator.generate_excuse(scenario, urgency, custom_excuse)
+            excuse = st.session_state.generator.generate_excuse(scenario, urgency, custom_excuse, mode.lower(), snapshot)
             st.session_state.last_excuse = excuse
-            st.markdown(f'<div class="output-box">📜 <strong>Excuse:</strong> {excuse}</div>', unsafe_allow_html=True)
+            st.session_state.current_excuse = excuse
             components.html("<script>triggerConfetti(); playCelebrationSound();</script>", height=0)
-            # Excuse rating
-            rating = st.slider("Rate this excuse (1-5 stars):", 1, 5, 3, key=f"rating_{excuse}")
-            if st.button("Submit Rating", key=f"submit_rating_{excuse}"):
-                st.session_state.generator.rate_excuse(excuse, rating)
-                st.success("Rating submitted!")
-                components.html("<script>playSuccessSound();</script>", height=0)
-            avg_rating = st.session_state.generator.get_average_rating(excuse)
-            if avg_rating:
-                st.markdown(f'<div class="output-box">⭐ Average Rating: {avg_rating:.1f}/5</div>', unsafe_allow_html=True)
-            share_to_clipboard(excuse)
-
-elif option == "Generate Proof":
+    # The current excuse stays on screen across reruns so it can still be rated
+    excuse = st.session_state.current_excuse
+    if excuse:
+        st.markdown(f'<div class="output-box">📜 <strong>Excuse:</strong> {excuse}</div>', unsafe_allow_html=True)
+        # Excuse rating
+        rating = st.slider("Rate this excuse (1-5 stars):", 1, 5, 3, key=f"rating_{excuse}")
+        if st.button("Submit Rating", key=f"submit_rating_{excuse}"):
+            st.session_state.generator.rate_excuse(excuse, rating)
+            st.success("Rating submitted!")
+            components.html("<script>playSuccessSound();</script>", height=0)
+        avg_rating = st.session_state.generator.get_average_rating(excuse)
+        if avg_rating:
+            st.markdown(f'<div class="output-box">⭐ Average Rating: {avg_rating:.1f}/5</div>', unsafe_allow_html=True)
+        share_to_clipboard(excuse)
+
+@st.fragment
+@track_fragment("proof_panel", get_rerun_stats, touch_session_memory)
+def proof_panel():
     st.markdown('<div class="section-title">📄 Generate Proof</div>', unsafe_allow_html=True)
     excuse = st.text_input("Enter the excuse for proof:", key="proof_excuse")
     patient_name = st.text_input("Enter patient name (for medical certificate):", key="patient_name")
@@ -757,16 +855,21 @@ elif option == "Generate Proof":
                 st.error("Error: Proof generation failed.")
                 components.html("<script>playErrorSound();</script>", height=0)
 
-elif option == "Generate Apology":
+@st.fragment
+@track_fragment("apology_panel", get_rerun_stats, touch_session_memory)
+def apology_panel():
     st.markdown('<div class="section-title">🙏 Generate Apology</div>', unsafe_allow_html=True)
-    tone = st.selectbox("Select tone:", ["Professional", "Emotional"], key="apology_tone")
+    snapshot = rerun_snapshot()
+    tone = st.selectbox("Select tone:", snapshot.tone_labels, key="apology_tone")
     if st.button("Generate Apology 💌"):
-        apology = st.session_state.generator.generate_apology(tone)
+        apology = st.session_state.generator.generate_apology(tone, snapshot)
         st.session_state.last_excuse = apology
         st.markdown(f'<div class="output-box">📜 <strong>Apology:</strong> {apology}</div>', unsafe_allow_html=True)
         share_to_clipboard(apology)
 
-elif option == "Save to Favorites":
+@st.fragment
+@track_fragment("favorites_panel", get_rerun_stats, touch_session_memory)
+def favorites_panel():
     st.markdown('<div class="section-title">⭐ Save to Favorites</div>', unsafe_allow_html=True)
     excuse = st.text_input("Enter excuse to save to favorites:", key="favorite_excuse")
     if st.button("Save to Favorites 💾"):
@@ -779,7 +882,9 @@ elif option == "Save to Favorites":
         else:
             st.warning("Already in favorites.")
 
-elif option == "View History":
+@st.fragment
+@track_fragment("history_panel", get_rerun_stats, touch_session_memory)
+def history_panel():
     st.markdown('<div class="section-title">📜 Excuse History</div>', unsafe_allow_html=True)
     history = st.session_state.generator.view_history()
     if history:
@@ -794,13 +899,17 @@ elif option == "View History":
     else:
         st.info("No history available.")
 
-elif option == "Auto-Schedule Prediction":
+@st.fragment
+@track_fragment("schedule_panel", get_rerun_stats, touch_session_memory)
+def schedule_panel():
     st.markdown('<div class="section-title">🔮 Auto-Schedule Prediction</div>', unsafe_allow_html=True)
     if st.button("Predict Next Excuse 🔍"):
         prediction = st.session_state.generator.auto_schedule()
         st.markdown(f'<div class="output-box">🔮 <strong>Prediction:</strong> {prediction}</div>', unsafe_allow_html=True)
 
-elif option == "Generate Speech":
+@st.fragment
+@track_fragment("speech_panel", get_rerun_stats, touch_session_memory)
+def speech_panel():
     st.markdown('<div class="section-title">🎙️ Generate Speech</div>', unsafe_allow_html=True)
     text = st.text_input("Enter text to convert to speech:", key="speech_text")
     lang = st.text_input("Enter language code (e.g., 'en' for English):", value="en", key="speech_lang")
@@ -809,13 +918,29 @@ elif option == "Generate Speech":
             st.error("Please enter text.")
             components.html("<script>playErrorSound();</script>", height=0)
         else:
-            filename, error = st.session_state.generator.generate_speech(text, lang)
+            # Play chunks back to back as soon as each is ready while the rest are synthesized
+            playback_id = uuid.uuid4().hex
+            with st.status("Synthesizing speech...", expanded=True) as speech_status:
+                def play_chunk(index, audio):
+                    queue_speech_chunk(audio, playback_id, index)
+                    st.write(f"▶️ Chunk {index + 1} queued")
+                filename, error = st.session_state.generator.generate_speech(text, lang, on_chunk=play_chunk)
+                speech_status.update(label="Speech chunks", state="error" if error else "complete", expanded=False)
             if error:
                 st.error(error)
                 components.html("<script>playErrorSound();</script>", height=0)
             elif filename and os.path.exists(filename):
                 st.success(f"Speech file generated: {filename}")
                 components.html("<script>playSuccessSound();</script>", height=0)
+                stats = st.session_state.generator.last_speech_stats
+                if stats:
+                    st.caption(
+                        f"🧩 {stats['segments']} segments, {stats['backend_calls']} synthesized | "
+                        f"Request hit rate: {stats['request_hit_rate']:.0%} | "
+                        f"Process cache hit rate: {stats['cache_hit_rate']:.0%} | "
+                        f"First audio: {stats['first_audio_ms']:.0f} ms | "
+                        f"Assembly: {stats['assembly_ms']:.1f} ms"
+                    )
                 st.markdown(get_binary_file_downloader_html(filename, f"Download {filename} 📥"), unsafe_allow_html=True)
                 audio_file = open(filename, 'rb')
                 st.audio(audio_file, format='audio/mp3')
@@ -825,11 +950,28 @@ elif option == "Generate Speech":
                 st.error("Error: Speech generation failed.")
                 components.html("<script>playErrorSound();</script>", height=0)
 
+@st.fragment
+@track_fragment("cleanup_panel", get_rerun_stats, touch_session_memory)
+def cleanup_panel():
+    if st.button("🧹 Clean Up Temporary Files"):
+        cleanup_temp_files()
+        st.success("Temporary files cleaned up!")
+        components.html("<script>playSuccessSound();</script>", height=0)
+
+# Main content based on selected option
+ACTION_PANELS = {
+    "Generate Excuse": excuse_panel,
+    "Generate Proof": proof_panel,
+    "Generate Apology": apology_panel,
+    "Save to Favorites": favorites_panel,
+    "View History": history_panel,
+    "Auto-Schedule Prediction": schedule_panel,
+    "Generate Speech": speech_panel
+}
+ACTION_PANELS[option]()
+
 # Clean up temporary files
-if st.button("🧹 Clean Up Temporary Files"):
-    cleanup_temp_files()
-    st.success("Temporary files cleaned up!")
-    components.html("<script>playSuccessSound();</script>", height=0)
+cleanup_panel()
 
 # Close dark mode div if active
 if st.session_state.dark_mode:
@@ -841,4 +983,6 @@ st.markdown(
     'Built with ❤️ by Darshan using Streamlit | © 2025 Excuse Generator'
     '</div>',
     unsafe_allow_html=True
-)
\ No newline at end of file
+)
+
+app_rerun.finish()
@@ -0,0 +1,218 @@
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+CONFIG_DIR = os.environ.get(
+    "EXCUSE_CONFIG_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "config")
+)
+CONFIG_FILES = ("corpus.json", "themes.json")
+
+logger = logging.getLogger(__name__)
+
+# Immutable view of the corpus plus everything derived from it. Reruns hold on to
+# the snapshot they started with; reloads publish a new one instead of mutating.
+CorpusSnapshot = namedtuple("CorpusSnapshot", [
+    "version",
+    "excuses",          # scenario -> tuple of excuses (the sampling table)
+    "apologies",        # tone -> apology
+    "themes",           # theme name -> CSS background
+    "theme_css",        # theme name -> precompiled <style> block
+    "scenario_labels",  # capitalized scenarios for selectboxes
+    "tone_labels",      # capitalized tones for selectboxes
+    "load_ms"
+])
+
+
+def _theme_css(themes, theme_name):
+    dark_background = themes.get('dark_' + theme_name.split('_')[-1], themes[theme_name])
+    return f"""
+    <style>
+    .stApp {{
+        background: {themes[theme_name]} !important;
+        background-size: cover, 200% !important;
+        background-attachment: fixed !important;
+    }}
+    .dark-mode .stApp {{
+        background: {dark_background} !important;
+        background-size: cover, 200% !important;
+        background-attachment: fixed !important;
+    }}
+    </style>
+    """
+
+
+def build_snapshot(config_dir, version):
+    """Load the config files and build every derived structure. Raises ValueError on bad config."""
+    start = time.perf_counter()
+    try:
+        with open(os.path.join(config_dir, "corpus.json"), encoding="utf-8") as f:
+            corpus = json.load(f)
+        with open(os.path.join(config_dir, "themes.json"), encoding="utf-8") as f:
+            themes = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise ValueError(f"Cannot read corpus config: {e}")
+    if not isinstance(corpus, dict) or not isinstance(themes, dict):
+        raise ValueError("corpus.json and themes.json must each hold a JSON object.")
+    raw_excuses = corpus.get("excuses", {})
+    raw_apologies = corpus.get("apologies", {})
+    if not isinstance(raw_excuses, dict) or not all(
+        isinstance(items, list) and all(isinstance(e, str) for e in items) for items in raw_excuses.values()
+    ):
+        raise ValueError('"excuses" must map each scenario to a list of strings.')
+    if not isinstance(raw_apologies, dict) or not all(isinstance(text, str) for text in raw_apologies.values()):
+        raise ValueError('"apologies" must map each tone to a string.')
+    if not all(isinstance(css, str) for css in themes.values()):
+        raise ValueError("themes.json must map each theme name to a CSS background string.")
+    excuses = {str(scenario).lower(): tuple(items) for scenario, items in raw_excuses.items() if items}
+    apologies = {str(tone).lower(): text for tone, text in raw_apologies.items()}
+    if not excuses or not apologies or not themes:
+        raise ValueError("Corpus config needs at least one excuse scenario, apology and theme.")
+    return CorpusSnapshot(
+        version=version,
+        excuses=MappingProxyType(excuses),
+        apologies=MappingProxyType(apologies),
+        themes=MappingProxyType(dict(themes)),
+        theme_css=MappingProxyType({name: _theme_css(themes, name) for name in themes}),
+        scenario_labels=tuple(scenario.capitalize() for scenario in excuses),
+        tone_labels=tuple(tone.capitalize() for tone in apologies),
+        load_ms=(time.perf_counter() - start) * 1000
+    )
+
+
+class CorpusStore:
+    """Holds the current CorpusSnapshot and swaps in a new one when the config files change.
+
+    Readers just read the snapshot attribute; rebinding it is atomic, so they never lock.
+    """
+
+    def __init__(self, config_dir=CONFIG_DIR, poll_interval=1.0):
+        self.config_dir = config_dir
+        self.poll_interval = poll_interval
+        self.last_error = None
+        self.snapshot = build_snapshot(config_dir, version=1)
+        self._mtimes = self._read_mtimes()
+        self._listeners = []
+        self._watcher = None
+        self._reload_lock = threading.Lock()
+
+    def _read_mtimes(self):
+        mtimes = []
+        for name in CONFIG_FILES:
+            try:
+                mtimes.append(os.stat(os.path.join(self.config_dir, name)).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        return mtimes
+
+    def subscribe(self, callback):
+        """Call callback(snapshot) after every successful reload."""
+        self._listeners.append(callback)
+
+    def reload(self):
+        """Rebuild from disk and publish the new snapshot. Keeps the old one if the config is bad."""
+        with self._reload_lock:
+            try:
+                snapshot = build_snapshot(self.config_dir, self.snapshot.version + 1)
+            except ValueError as e:
+                self.last_error = str(e)
+                logger.warning("Keeping corpus version %d: %s", self.snapshot.version, e)
+                return False
+            self.last_error = None
+            self.snapshot = snapshot
+        for callback in list(self._listeners):
+            try:
+                callback(snapshot)
+            except Exception:
+                logger.exception("Corpus reload listener %r failed", callback)
+        return True
+
+    def watch(self):
+        """Start the background thread that polls the config files for changes."""
+        if self._watcher is None:
+            self._watcher = threading.Thread(target=self._run_watcher, daemon=True)
+            self._watcher.start()
+        return self
+
+    def _run_watcher(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                mtimes = self._read_mtimes()
+                if mtimes != self._mtimes:
+                    self._mtimes = mtimes
+                    self.reload()
+            except Exception:
+                # Keep watching: a later edit may fix whatever went wrong
+                logger.exception("Corpus reload failed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure corpus reload time and reader latency during reloads.")
+    parser.add_argument("--readers", type=int, default=8, help="Reader threads sampling excuses")
+    parser.add_argument("--seconds", type=float, default=2.0, help="Duration of each phase")
+    parser.add_argument("--scale", type=int, default=200, help="Multiply the corpus size by this factor")
+    args = parser.parse_args()
+
+    # Work on an enlarged copy so reloads are measurable
+    work_dir = tempfile.mkdtemp(prefix="excuse_corpus_")
+    shutil.copy(os.path.join(CONFIG_DIR, "themes.json"), work_dir)
+    with open(os.path.join(CONFIG_DIR, "corpus.json"), encoding="utf-8") as f:
+        corpus = json.load(f)
+    corpus["excuses"] = {
+        scenario: [f"{e} ({n})" for n in range(args.scale) for e in items]
+        for scenario, items in corpus["excuses"].items()
+    }
+    with open(os.path.join(work_dir, "corpus.json"), "w", encoding="utf-8") as f:
+        json.dump(corpus, f)
+    store = CorpusStore(work_dir)
+
+    def run_readers(duration):
+        latencies = []
+        lock = threading.Lock()
+        deadline = time.perf_counter() + duration
+
+        def reader():
+            rng = random.Random()
+            local = []
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                snapshot = store.snapshot
+                rng.choice(snapshot.excuses[rng.choice(snapshot.scenario_labels).lower()])
+                local.append((time.perf_counter() - start) * 1e6)
+            with lock:
+                latencies.extend(local)
+
+        threads = [threading.Thread(target=reader) for _ in range(args.readers)]
+        for thread in threads:
+            thread.start()
+        return threads, latencies
+
+    def report(label, latencies):
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[int(len(latencies) * 0.99)]
+        print(f"{label}: {len(latencies)} reads, p50 {p50:.1f} µs, p99 {p99:.1f} µs")
+
+    threads, quiet = run_readers(args.seconds)
+    for thread in threads:
+        thread.join()
+    report("Readers, no reload  ", quiet)
+
+    threads, busy = run_readers(args.seconds)
+    reload_times = []
+    while any(thread.is_alive() for thread in threads):
+        start = time.perf_counter()
+        store.reload()
+        reload_times.append((time.perf_counter() - start) * 1000)
+    report("Readers, reloading  ", busy)
+    print(f"Reloads: {len(reload_times)}, mean {sum(reload_times) / len(reload_times):.1f} ms "
+          f"(snapshot build {store.snapshot.load_ms:.1f} ms)")
+    shutil.rmtree(work_dir)
@@ -0,0 +1,368 @@
+import argparse
+import json
+import os
+import random
+import resource
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from PIL import Image
+from streamlit.runtime import Runtime
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1.util import patch_config_options
+from memory import deep_sizeof
+from perf import percentile
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+# Relative weights of the scripted actions each simulated session replays
+ACTION_MIX = {
+    "generate": 35,
+    "rate": 20,
+    "history": 20,
+    "speech": 15,
+    "upload": 10
+}
+
+SCENARIOS = ["Work", "School", "Social", "Family"]
+URGENCIES = ["Low", "Medium", "High"]
+
+
+def make_background(size, rng):
+    """Return PNG bytes of a noisy image so uploads are realistically large."""
+    img = Image.frombytes("RGB", (size, size), rng.randbytes(size * size * 3))
+    buf = BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def current_rss_mb():
+    """Return the resident set size of this process in MiB."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class RssSampler(threading.Thread):
+    """Background thread recording (elapsed seconds, RSS MiB) samples."""
+
+    def __init__(self, interval=0.5):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+        self._start = time.perf_counter()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.samples.append((round(time.perf_counter() - self._start, 2), round(current_rss_mb(), 1)))
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.samples.append((round(time.perf_counter() - self._start, 2), round(current_rss_mb(), 1)))
+
+
+class SimulatedSession:
+    """One browser session of app.py driven through AppTest."""
+
+    def __init__(self, index, config):
+        self.index = index
+        self.config = config
+        self.rng = random.Random(config["seed"] * 100003 + index)
+        self.latencies = defaultdict(list)
+        self.errors = 0
+        self.at = AppTest.from_file(APP_PATH, default_timeout=config["timeout"])
+
+    def rerun(self, action):
+        start = time.perf_counter()
+        try:
+            self.at.run()
+        except Exception:
+            self.errors += 1
+            return
+        self.latencies[action].append((time.perf_counter() - start) * 1000)
+        if self.at.exception:
+            self.errors += 1
+
+    def navigate(self, option):
+        box = self.at.selectbox(key="action_select")
+        if box.value != option:
+            box.set_value(option)
+            self.rerun("navigate")
+
+    def click(self, label, action):
+        button = next((b for b in self.at.button if b.label == label), None)
+        if button is None:
+            self.errors += 1
+            return False
+        button.click()
+        self.rerun(action)
+        return True
+
+    def generate(self):
+        self.navigate("Generate Excuse")
+        self.at.selectbox(key="excuse_scenario").set_value(self.rng.choice(SCENARIOS))
+        self.at.selectbox(key="excuse_urgency").set_value(self.rng.choice(URGENCIES))
+        self.at.radio(key="excuse_mode").set_value(self.rng.choice(["Random", "Recommended"]))
+        self.click("Generate Excuse 🚀", "generate")
+
+    def rate(self):
+        self.generate()
+        slider = next((s for s in self.at.slider if (s.key or "").startswith("rating_")), None)
+        if slider is None:
+            self.errors += 1
+            return
+        slider.set_value(self.rng.randint(1, 5))
+        self.click("Submit Rating", "rate")
+
+    def history(self):
+        self.navigate("View History")
+        self.rerun("history")
+
+    def speech(self):
+        self.navigate("Generate Speech")
+        self.at.text_input(key="speech_text").input(self.rng.choice(self.config["texts"]))
+        self.click("Generate Speech 🎧", "speech")
+
+    def upload(self):
+        # AppTest cannot drive st.file_uploader, so hand the bytes to the session directly
+        data = make_background(self.config["image_size"], self.rng)
+        self.at.session_state["memory"].set_background(data, f"upload-{self.rng.random()}")
+        self.rerun("upload")
+
+    def session_state_bytes(self):
+        state = self.at.session_state
+        keys = getattr(state, "filtered_state", None) or {key: state[key] for key in state}
+        # The generator and memory objects reference process-wide caches, so use the session footprint
+        sizes = {key: deep_sizeof(value) for key, value in keys.items() if key not in ("generator", "memory")}
+        if "memory" in keys:
+            sizes.update(keys["memory"].footprint())
+            del sizes["total"], sizes["spilled_to_disk"]
+        return sizes
+
+    def play(self):
+        self.rerun("load")
+        if self.at.exception:
+            return
+        generator = self.at.session_state["generator"]
+        for n in range(self.config["history_size"]):
+            generator.history.append({
+                "scenario": self.rng.choice(SCENARIOS).lower(),
+                "excuse": f"Seeded excuse #{n} for history browsing.",
+                "timestamp": f"2025-01-01 00:00:{n % 60:02d}"
+            })
+        actions, weights = zip(*ACTION_MIX.items())
+        for _ in range(self.config["actions"]):
+            getattr(self, self.rng.choices(actions, weights)[0])()
+            if self.config["think_time"]:
+                time.sleep(self.rng.uniform(0, self.config["think_time"]))
+
+
+@contextmanager
+def share_runtime_across_threads():
+    """Keep AppTest's process-wide state visible to every thread while the block runs.
+
+    AppTest installs a mock Runtime and patches the global.appTest config option
+    around each run, then undoes both afterwards, so with sessions running in
+    parallel threads one session's cleanup pulls them out from under another
+    mid-rerun. The last mock Runtime stays visible and the option stays on until
+    the block exits, which restores the originals.
+    """
+    last = {}
+    original_instance = Runtime.__dict__["instance"]
+    original_exists = Runtime.__dict__["exists"]
+
+    def instance(cls):
+        if cls._instance is not None:
+            last["runtime"] = cls._instance
+        if "runtime" not in last:
+            raise RuntimeError("Runtime hasn't been created!")
+        return last["runtime"]
+
+    def exists(cls):
+        return cls._instance is not None or "runtime" in last
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(exists)
+    try:
+        with patch_config_options({"global.appTest": True}):
+            yield
+    finally:
+        Runtime.instance = original_instance
+        Runtime.exists = original_exists
+
+
+def run_sessions(count, config, offset=0):
+    """Run count sessions in threads and collect their measurements."""
+    sampler = RssSampler(config["rss_interval"])
+    sampler.start()
+    sessions = []
+    lock = threading.Lock()
+
+    def worker(index):
+        session = SimulatedSession(index, config)
+        try:
+            session.play()
+        except Exception:
+            session.errors += 1
+        with lock:
+            sessions.append(session)
+
+    threads = [threading.Thread(target=worker, args=(offset + i,)) for i in range(count)]
+    with share_runtime_across_threads():
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    sampler.stop()
+
+    latencies = defaultdict(list)
+    for session in sessions:
+        for action, values in session.latencies.items():
+            latencies[action].extend(values)
+    return {
+        "latencies": dict(latencies),
+        "errors": sum(session.errors for session in sessions),
+        "session_state_bytes": [session.session_state_bytes() for session in sessions],
+        "rss": sampler.samples
+    }
+
+
+def _run_worker(args):
+    count, config, offset = args
+    return run_sessions(count, config, offset)
+
+
+def run_stage(count, config):
+    """Run one load stage, in threads or split across worker processes."""
+    if config["mode"] == "thread":
+        return run_sessions(count, config)
+    workers = min(config["processes"], count)
+    shares = [count // workers + (1 if i < count % workers else 0) for i in range(workers)]
+    offsets = [sum(shares[:i]) for i in range(workers)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = list(pool.map(_run_worker, [(share, config, offset) for share, offset in zip(shares, offsets)]))
+    latencies = defaultdict(list)
+    for part in parts:
+        for action, values in part["latencies"].items():
+            latencies[action].extend(values)
+    return {
+        "latencies": dict(latencies),
+        "errors": sum(part["errors"] for part in parts),
+        "session_state_bytes": [s for part in parts for s in part["session_state_bytes"]],
+        # Worker processes sample independently; their peaks are summed as the pod total
+        "rss": [sample for part in parts for sample in part["rss"]],
+        "peak_rss_mb": sum(max(rss for _, rss in part["rss"]) for part in parts)
+    }
+
+
+def summarize(count, result):
+    all_latencies = [v for values in result["latencies"].values() for v in values]
+    session_totals = [sum(s.values()) for s in result["session_state_bytes"]]
+    reruns = len(all_latencies)
+    return {
+        "sessions": count,
+        "reruns": reruns,
+        "errors": result["errors"],
+        "error_rate": result["errors"] / max(1, reruns),
+        "p50_ms": percentile(all_latencies, 50),
+        "p95_ms": percentile(all_latencies, 95),
+        "p99_ms": percentile(all_latencies, 99),
+        "per_action_p95_ms": {a: percentile(v, 95) for a, v in result["latencies"].items()},
+        "session_state_mb_mean": sum(session_totals) / max(1, len(session_totals)) / 2**20,
+        "session_state_mb_max": max(session_totals, default=0) / 2**20,
+        "peak_rss_mb": result.get("peak_rss_mb", max((rss for _, rss in result["rss"]), default=0.0)),
+        "rss_timeline": result["rss"]
+    }
+
+
+def breaking_reason(summary, args):
+    """Return why a stage counts as a fallen-over pod, or None if it held up."""
+    if summary["p95_ms"] > args.p95_limit:
+        return f"p95 {summary['p95_ms']:.0f} ms > {args.p95_limit:.0f} ms"
+    if summary["error_rate"] > args.error_limit:
+        return f"error rate {summary['error_rate']:.1%} > {args.error_limit:.1%}"
+    if args.rss_limit and summary["peak_rss_mb"] > args.rss_limit:
+        return f"RSS {summary['peak_rss_mb']:.0f} MiB > {args.rss_limit:.0f} MiB"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate concurrent sessions of app.py with Streamlit AppTest.")
+    parser.add_argument("--ramp", default="1,5,10,20,40", help="Comma-separated session counts to step through")
+    parser.add_argument("--actions", type=int, default=20, help="Scripted actions per session")
+    parser.add_argument("--mode", choices=["thread", "process"], default="thread")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 2, help="Worker processes in process mode")
+    parser.add_argument("--history-size", type=int, default=500, help="History entries seeded into each session")
+    parser.add_argument("--image-size", type=int, default=512, help="Edge length of uploaded backgrounds (px)")
+    parser.add_argument("--speech-latency", type=float, default=0.2, help="Fake speech backend latency (s)")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Max random pause between actions (s)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="AppTest rerun timeout (s)")
+    parser.add_argument("--rss-interval", type=float, default=0.5, help="RSS sampling interval (s)")
+    parser.add_argument("--p95-limit", type=float, default=2000.0, help="p95 rerun latency that counts as failure (ms)")
+    parser.add_argument("--error-limit", type=float, default=0.01, help="Error rate that counts as failure")
+    parser.add_argument("--rss-limit", type=float, default=0.0, help="Pod memory limit (MiB); 0 disables")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write full results, including RSS timelines, to this file")
+    args = parser.parse_args()
+
+    if args.json:
+        args.json = os.path.abspath(args.json)
+    # Speech must never reach the network during a load test
+    os.environ["SPEECH_BACKEND"] = "fake"
+    os.environ["SPEECH_FAKE_LATENCY"] = str(args.speech_latency)
+    # Generated proofs and speech files land in a scratch directory
+    os.chdir(tempfile.mkdtemp(prefix="excuse_loadtest_"))
+
+    config = {
+        "seed": args.seed,
+        "mode": args.mode,
+        "processes": args.processes,
+        "actions": args.actions,
+        "history_size": args.history_size,
+        "image_size": args.image_size,
+        "think_time": args.think_time,
+        "timeout": args.timeout,
+        "rss_interval": args.rss_interval,
+        "texts": [
+            "Urgent: I'm unwell and need to visit a doctor today.",
+            "Just a heads-up: I missed the bus and won't make it to class on time.",
+            "I sincerely apologize for any inconvenience caused. Please let me know how I can make this right."
+        ]
+    }
+
+    print(f"{'sessions':>8} {'reruns':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} "
+          f"{'state MiB':>10} {'RSS MiB':>8}")
+    summaries = []
+    breaking_point = None
+    for count in [int(n) for n in args.ramp.split(",") if n.strip()]:
+        summary = summarize(count, run_stage(count, config))
+        summaries.append(summary)
+        print(f"{count:>8} {summary['reruns']:>7} {summary['p50_ms']:>8.0f} {summary['p95_ms']:>8.0f} "
+              f"{summary['p99_ms']:>8.0f} {summary['errors']:>7} {summary['session_state_mb_mean']:>10.2f} "
+              f"{summary['peak_rss_mb']:>8.0f}")
+        reason = breaking_reason(summary, args)
+        if reason:
+            breaking_point = {"sessions": count, "reason": reason}
+            break
+
+    if breaking_point:
+        print(f"Pod fell over at {breaking_point['sessions']} sessions: {breaking_point['reason']}")
+    else:
+        print("Pod held up at every stage of the ramp.")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"stages": summaries, "breaking_point": breaking_point}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
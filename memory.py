@@ -0,0 +1,263 @@
+import logging
+import os
+import pickle
+import sys
+import tempfile
+import threading
+import time
+import weakref
+from io import BytesIO
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Per-session caps; each can be overridden with a SESSION_<NAME> environment variable
+DEFAULT_LIMITS = {
+    "max_history": 200,
+    "max_favorites": 100,
+    "max_rated_excuses": 500,
+    "max_ratings_per_excuse": 50,
+    "max_background_bytes": 2 * 2**20,
+    "max_background_edge": 1920,
+    "max_temp_files": 20,
+    "idle_seconds": 600,
+    "keep_recent_history": 20,
+    "sweep_interval": 60
+}
+
+
+def load_limits():
+    """Return DEFAULT_LIMITS with any SESSION_<NAME> environment overrides applied."""
+    limits = dict(DEFAULT_LIMITS)
+    for name, default in DEFAULT_LIMITS.items():
+        value = os.environ.get(f"SESSION_{name.upper()}")
+        if value is not None:
+            limits[name] = type(default)(value)
+    return limits
+
+
+def deep_sizeof(obj, seen=None):
+    """Estimate the memory held by an object graph in bytes."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, BytesIO):
+        size += obj.getbuffer().nbytes
+    elif isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+        size += deep_sizeof(vars(obj), seen)
+    return size
+
+
+def shrink_image(data, max_bytes, max_edge):
+    """Downscale image bytes to fit max_bytes; return None if they still don't fit."""
+    if len(data) <= max_bytes:
+        return data
+    try:
+        img = Image.open(BytesIO(data)).convert("RGB")
+    except Exception:
+        return None
+    img.thumbnail((max_edge, max_edge))
+    buf = BytesIO()
+    img.save(buf, format="JPEG", quality=85)
+    data = buf.getvalue()
+    return data if len(data) <= max_bytes else None
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class SessionMemory:
+    """Heavy per-session state with size accounting, caps and idle spill-to-disk."""
+
+    def __init__(self, generator, limits=None):
+        self.generator = generator
+        self.limits = limits or load_limits()
+        self.background = None  # Raw image bytes, read once from the upload
+        self.background_id = None
+        self.temp_files = []
+        self.last_active = time.monotonic()
+        self.spill_path = None
+        self._spill_finalizer = None
+        self._lock = threading.Lock()
+
+    def touch(self):
+        """Mark the session active, restoring spilled objects and enforcing caps."""
+        with self._lock:
+            self.last_active = time.monotonic()
+            if self.spill_path:
+                self._restore()
+            self._enforce_caps()
+
+    def set_background(self, data, background_id=None):
+        """Store an uploaded background, downscaling it to the cap. Returns False if it can't fit."""
+        data = shrink_image(data, self.limits["max_background_bytes"], self.limits["max_background_edge"])
+        if data is None:
+            return False
+        with self._lock:
+            self.background = data
+            self.background_id = background_id
+        return True
+
+    def add_temp_file(self, path):
+        """Track a generated file, deleting the oldest ones beyond the cap."""
+        with self._lock:
+            if path not in self.temp_files:
+                self.temp_files.append(path)
+            self._enforce_caps()
+
+    def clear_temp_files(self):
+        """Delete every tracked temporary file."""
+        with self._lock:
+            for path in self.temp_files:
+                _remove_quietly(path)
+            self.temp_files = []
+
+    def _enforce_caps(self):
+        history = self.generator.history
+        if len(history) > self.limits["max_history"]:
+            self.generator.history = history[len(history) - self.limits["max_history"]:]
+        favorites = self.generator.favorites
+        if len(favorites) > self.limits["max_favorites"]:
+            self.generator.favorites = favorites[len(favorites) - self.limits["max_favorites"]:]
+        ratings = self.generator.ratings
+        for values in ratings.values():
+            if len(values) > self.limits["max_ratings_per_excuse"]:
+                del values[:len(values) - self.limits["max_ratings_per_excuse"]]
+        if len(ratings) > self.limits["max_rated_excuses"]:
+            for excuse in list(ratings)[:len(ratings) - self.limits["max_rated_excuses"]]:
+                del ratings[excuse]
+        while len(self.temp_files) > self.limits["max_temp_files"]:
+            _remove_quietly(self.temp_files.pop(0))
+
+    def spill(self):
+        """Move the background and old history to disk if the session has been idle too long.
+
+        Returns the estimated number of bytes released.
+        """
+        with self._lock:
+            if self.spill_path or time.monotonic() - self.last_active < self.limits["idle_seconds"]:
+                return 0
+            history = self.generator.history
+            old_count = max(0, len(history) - self.limits["keep_recent_history"])
+            payload = {"background": self.background, "history": history[:old_count]}
+            if payload["background"] is None and not payload["history"]:
+                return 0
+            released = deep_sizeof(payload)
+            fd, path = tempfile.mkstemp(prefix="excuse_session_", suffix=".pkl")
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+            self.background = None
+            # Swap in a new list rather than deleting in place, so a rerun iterating
+            # the old one is unaffected
+            self.generator.history = history[old_count:]
+            self.spill_path = path
+            self._spill_finalizer = weakref.finalize(self, _remove_quietly, path)
+            return released
+
+    def _restore(self):
+        try:
+            with open(self.spill_path, "rb") as f:
+                payload = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            payload = {"background": None, "history": []}
+        if self.background is None:
+            self.background = payload["background"]
+        self.generator.history = payload["history"] + self.generator.history
+        self._spill_finalizer()
+        self._spill_finalizer = None
+        self.spill_path = None
+
+    def footprint(self):
+        """Estimate the bytes held in memory by each heavy component."""
+        generator = self.generator
+        # Shallow copies are atomic, so the sweeper can measure while the session mutates
+        components = {
+            "history": deep_sizeof(list(generator.history)),
+            "ratings": deep_sizeof(dict(generator.ratings)),
+            "favorites": deep_sizeof(list(generator.favorites)),
+            "background": len(self.background) if self.background else 0,
+            "temp_files": deep_sizeof(list(self.temp_files))
+        }
+        components["total"] = sum(components.values())
+        spill_path = self.spill_path
+        components["spilled_to_disk"] = os.path.getsize(spill_path) if spill_path and os.path.exists(spill_path) else 0
+        return components
+
+
+class SessionRegistry:
+    """Process-wide view of all live sessions' memory, with a background idle sweeper."""
+
+    def __init__(self, limits=None):
+        self.limits = limits or load_limits()
+        self.last_aggregate = None
+        self._sessions = weakref.WeakSet()
+        self._shared = {}  # name -> footprint() of a process-wide structure
+        self._lock = threading.Lock()
+        self._sweeper = None
+
+    def register(self, memory):
+        with self._lock:
+            self._sessions.add(memory)
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._run_sweeper, daemon=True)
+                self._sweeper.start()
+
+    def sessions(self):
+        with self._lock:
+            return list(self._sessions)
+
+    def track_shared(self, name, footprint):
+        """Report a process-wide structure in the aggregate; footprint() returns a dict with a "total"."""
+        with self._lock:
+            self._shared[name] = footprint
+
+    def sweep(self):
+        """Spill idle sessions and refresh the aggregate snapshot."""
+        released = sum(memory.spill() for memory in self.sessions())
+        self.aggregate()
+        return released
+
+    def aggregate(self):
+        """Compute pod-level memory totals across sessions."""
+        footprints = [memory.footprint() for memory in self.sessions()]
+        with self._lock:
+            shared = dict(self._shared)
+        shared = {name: footprint() for name, footprint in shared.items()}
+        totals = [f["total"] for f in footprints]
+        components = {}
+        for footprint in footprints:
+            for name, size in footprint.items():
+                if name not in ("total", "spilled_to_disk"):
+                    components[name] = components.get(name, 0) + size
+        self.last_aggregate = {
+            "sessions": len(footprints),
+            "spilled_sessions": sum(1 for f in footprints if f["spilled_to_disk"]),
+            "total_bytes": sum(totals),
+            "mean_bytes": sum(totals) / len(totals) if totals else 0,
+            "max_bytes": max(totals, default=0),
+            "spilled_bytes_on_disk": sum(f["spilled_to_disk"] for f in footprints),
+            "components": components,
+            "shared": shared,
+            "shared_bytes": sum(f["total"] for f in shared.values()),
+            "computed_at": time.strftime("%Y-%m-%d %H:%M:%S")
+        }
+        return self.last_aggregate
+
+    def _run_sweeper(self):
+        while True:
+            time.sleep(self.limits["sweep_interval"])
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Session memory sweep failed")
@@ -0,0 +1,120 @@
+import functools
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+logger = logging.getLogger(__name__)
+_byte_counting_unavailable = threading.Event()
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+class RerunStats:
+    """Process-wide samples of rerun time and bytes sent, grouped by scope."""
+
+    def __init__(self, max_samples=500):
+        self._samples = defaultdict(lambda: deque(maxlen=max_samples))
+        self._lock = threading.Lock()
+
+    def record(self, scope, elapsed_ms, sent_bytes):
+        """Add one rerun; sent_bytes is None when bytes could not be counted."""
+        with self._lock:
+            self._samples[scope].append((elapsed_ms, sent_bytes))
+
+    def summary(self):
+        """Return per-scope rerun counts, latency and mean bytes sent."""
+        with self._lock:
+            samples = {scope: list(values) for scope, values in self._samples.items()}
+        result = {}
+        for scope, values in samples.items():
+            times = [ms for ms, _ in values]
+            sizes = [nbytes for _, nbytes in values if nbytes is not None]
+            result[scope] = {
+                "reruns": len(values),
+                "mean_ms": round(sum(times) / len(times), 1),
+                "p95_ms": round(percentile(times, 95), 1),
+                "mean_bytes": round(sum(sizes) / len(sizes)) if sizes else None
+            }
+        return result
+
+
+class RerunTimer:
+    """Measures one rerun: wall time and the size of every ForwardMsg sent to the browser.
+
+    Bytes are counted by wrapping ScriptRunContext._enqueue, a Streamlit internal.
+    If a Streamlit version lacks it, byte counting is switched off (recorded as
+    None, logged once) and only wall time is measured.
+    """
+
+    def __init__(self, stats, scope):
+        self.stats = stats
+        self.scope = scope
+        self.sent_bytes = 0
+        self._ctx = None
+        self._start = None
+
+    def start(self):
+        self._ctx = get_script_run_ctx()
+        enqueue = getattr(self._ctx, "_enqueue", None)
+        if not callable(enqueue):
+            self.sent_bytes = None
+            if self._ctx is not None and not _byte_counting_unavailable.is_set():
+                _byte_counting_unavailable.set()
+                logger.warning("ScriptRunContext has no _enqueue; rerun stats will not count bytes sent")
+        else:
+            # Unwrap a counter left behind by a rerun that was interrupted before finish()
+            original = getattr(enqueue, "__wrapped__", enqueue)
+
+            def counting_enqueue(msg):
+                self.sent_bytes += msg.ByteSize()
+                original(msg)
+
+            counting_enqueue.__wrapped__ = original
+            self._ctx._enqueue = counting_enqueue
+        self._start = time.perf_counter()
+        return self
+
+    def finish(self):
+        elapsed_ms = (time.perf_counter() - self._start) * 1000
+        enqueue = getattr(self._ctx, "_enqueue", None)
+        if enqueue is not None and hasattr(enqueue, "__wrapped__"):
+            self._ctx._enqueue = enqueue.__wrapped__
+        self.stats.record(self.scope, elapsed_ms, self.sent_bytes)
+
+
+def is_fragment_rerun():
+    """Return True when the current run only executes fragments, not the whole script."""
+    ctx = get_script_run_ctx()
+    return bool(getattr(ctx, "fragment_ids_this_run", None))
+
+
+def track_fragment(scope, get_stats, on_rerun=None):
+    """Record fragment-only reruns of the decorated function under scope.
+
+    Full-script runs are already measured as a whole, so they are not counted again.
+    on_rerun, if given, is called at the start of every fragment-only rerun, for
+    per-interaction work that lives at the top of the script and is skipped.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not is_fragment_rerun():
+                return func(*args, **kwargs)
+            timer = RerunTimer(get_stats(), scope).start()
+            try:
+                if on_rerun is not None:
+                    on_rerun()
+                return func(*args, **kwargs)
+            finally:
+                timer.finish()
+        return wrapper
+    return decorator
@@ -0,0 +1,278 @@
+import argparse
+import logging
+import random
+import threading
+import time
+import numpy as np
+from scipy import sparse
+from memory import deep_sizeof
+
+logger = logging.getLogger(__name__)
+
+
+class ExcuseRecommender:
+    """Cross-user, item-based collaborative filtering over excuse ratings.
+
+    Ratings land in a sparse user x excuse matrix as they arrive; a background
+    thread periodically rebuilds item similarities and per-user top-k lists,
+    which are published as a new dict so lookups never wait on a rebuild.
+    Excuses a user rated below min_rating are never recommended to them, and
+    users who stop rating are forgotten after user_ttl seconds or once more
+    than max_users have rated more recently.
+    """
+
+    def __init__(self, corpus, prefixes=(), top_k=2, min_rating=3, rebuild_interval=30, prior_weight=2,
+                 max_users=10000, user_ttl=24 * 3600):
+        self.top_k = top_k
+        self.min_rating = min_rating
+        self.rebuild_interval = rebuild_interval
+        self.prior_weight = prior_weight
+        self.max_users = max_users
+        self.user_ttl = user_ttl
+        self.last_rebuild_ms = None
+        self._prefixes = prefixes
+        self._user_index = {}
+        self._ratings = {}  # (user row, item column) -> latest rating
+        self._last_seen = {}  # user id -> monotonic time of their latest rating
+        self._disliked = {}  # user id -> frozenset of excuses rated below min_rating
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._worker = None
+        self._recommendations = {}  # (user id, scenario) -> [(excuse, predicted score)], best first
+        self._set_corpus(corpus)
+
+    def _set_corpus(self, corpus):
+        self._items = [excuse for excuses in corpus.values() for excuse in excuses]
+        self._item_index = {excuse: i for i, excuse in enumerate(self._items)}
+        self._scenario_items = {}
+        for scenario, excuses in corpus.items():
+            self._scenario_items[scenario] = np.array([self._item_index[e] for e in excuses])
+        # Without ratings there is nothing to rank by, so every excuse is equally likely
+        self._popular = {scenario: [(e, 1.0) for e in excuses] for scenario, excuses in corpus.items()}
+
+    def _scenario_top_k(self, size):
+        """Keep lists shorter than the scenario, so recommending differs from picking at random."""
+        return max(1, min(self.top_k, size - 1))
+
+    def update_corpus(self, corpus):
+        """Switch to a new excuse corpus, keeping ratings of excuses that still exist."""
+        with self._lock:
+            old_items = self._items
+            self._set_corpus(corpus)
+            ratings = {}
+            for (row, item), rating in self._ratings.items():
+                new_item = self._item_index.get(old_items[item])
+                if new_item is not None:
+                    ratings[(row, new_item)] = rating
+            self._ratings = ratings
+            self._recommendations = {}
+            self._dirty = True
+        self.rebuild()
+
+    def _item_for(self, excuse):
+        for prefix in self._prefixes:
+            if excuse.startswith(prefix):
+                excuse = excuse[len(prefix):]
+                break
+        return self._item_index.get(excuse)
+
+    def record(self, user_id, excuse, rating):
+        """Add or replace a user's rating of a corpus excuse. Returns False for custom excuses."""
+        with self._lock:
+            item = self._item_for(excuse)
+            if item is None:
+                return False
+            row = self._user_index.setdefault(user_id, len(self._user_index))
+            self._ratings[(row, item)] = float(rating)
+            self._last_seen[user_id] = time.monotonic()
+            # Replace rather than mutate the set, so lock-free readers never see it change
+            disliked = self._disliked.get(user_id, frozenset())
+            if rating < self.min_rating:
+                self._disliked[user_id] = disliked | {self._items[item]}
+            elif self._items[item] in disliked:
+                self._disliked[user_id] = disliked - {self._items[item]}
+            self._dirty = True
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run_worker, daemon=True)
+                self._worker.start()
+        return True
+
+    def recommend(self, user_id, scenario):
+        """Return a user's precomputed top-k (excuse, predicted score) pairs, best first.
+
+        Users without a list get the most popular excuses. Excuses the user has
+        rated low since the last rebuild are filtered out here.
+        """
+        ranked = self._recommendations.get((user_id, scenario))
+        if ranked is None:
+            ranked = self._popular.get(scenario, [])
+        disliked = self._disliked.get(user_id)
+        if disliked:
+            ranked = [(excuse, score) for excuse, score in ranked if excuse not in disliked]
+        return ranked
+
+    def choose(self, user_id, scenario, rng=random):
+        """Sample one recommended excuse, weighted by predicted score. Returns None if none qualify."""
+        ranked = self.recommend(user_id, scenario)
+        if not ranked:
+            return None
+        excuses, scores = zip(*ranked)
+        return rng.choices(excuses, weights=[max(score, 1e-3) for score in scores])[0]
+
+    def prune(self):
+        """Forget users not seen within user_ttl, then the least recently seen beyond max_users.
+
+        Returns the number of users removed.
+        """
+        with self._lock:
+            now = time.monotonic()
+            recent = sorted(self._last_seen.items(), key=lambda entry: entry[1], reverse=True)
+            keep = [user_id for user_id, seen in recent if now - seen < self.user_ttl][:self.max_users]
+            removed = len(self._user_index) - len(keep)
+            if not removed:
+                return 0
+            rows = {self._user_index[user_id]: row for row, user_id in enumerate(keep)}
+            self._user_index = {user_id: row for row, user_id in enumerate(keep)}
+            self._ratings = {(rows[row], item): rating for (row, item), rating in self._ratings.items() if row in rows}
+            self._last_seen = {user_id: self._last_seen[user_id] for user_id in keep}
+            self._disliked = {user_id: d for user_id, d in self._disliked.items() if user_id in self._user_index}
+            self._recommendations = {
+                key: ranked for key, ranked in self._recommendations.items() if key[0] in self._user_index
+            }
+            self._dirty = True
+            return removed
+
+    def rebuild(self):
+        """Recompute similarities and top-k lists from a snapshot of the ratings."""
+        with self._lock:
+            if not self._dirty:
+                return False
+            ratings = dict(self._ratings)
+            users = dict(self._user_index)
+            items = self._items
+            scenario_items = self._scenario_items
+            self._dirty = False
+        if not ratings:
+            return False
+        start = time.perf_counter()
+
+        keys = np.array(list(ratings.keys()))
+        values = np.array(list(ratings.values()))
+        shape = (len(users), len(items))
+        matrix = sparse.csr_matrix((values, (keys[:, 0], keys[:, 1])), shape=shape)
+        matrix.sort_indices()
+
+        # Mean-center each user's ratings so similarity reflects taste, not generosity
+        counts = np.diff(matrix.indptr)
+        user_means = np.asarray(matrix.sum(axis=1)).ravel() / np.maximum(counts, 1)
+        centered = matrix.copy()
+        centered.data = centered.data - np.repeat(user_means, counts)
+
+        # Adjusted-cosine item-item similarity
+        norms = np.sqrt(np.asarray(centered.multiply(centered).sum(axis=0)).ravel())
+        norms[norms == 0] = 1.0
+        normalized = centered.multiply(1.0 / norms).tocsr()
+        similarity = (normalized.T @ normalized).toarray()
+        np.fill_diagonal(similarity, 0.0)
+
+        indicator = matrix.copy()
+        indicator.data = np.ones_like(indicator.data)
+        weights = indicator @ np.abs(similarity)
+        scores = user_means[:, None] + (centered @ similarity) / np.maximum(weights, 1e-9)
+        # A user's own ratings override predictions, and low-rated excuses are never recommended
+        rated = matrix.toarray()
+        has_rating = indicator.toarray() > 0
+        scores = np.where(has_rating, rated, scores)
+        scores[has_rating & (rated < self.min_rating)] = -np.inf
+
+        # Popularity fallback for users without ratings, shrunk toward the global mean
+        item_counts = np.diff(matrix.tocsc().indptr)
+        item_sums = np.asarray(matrix.sum(axis=0)).ravel()
+        global_mean = values.mean()
+        popularity = (item_sums + self.prior_weight * global_mean) / (item_counts + self.prior_weight)
+
+        user_ids = [None] * len(users)
+        for user_id, row in users.items():
+            user_ids[row] = user_id
+        recommendations = {}
+        popular = {}
+        for scenario, columns in scenario_items.items():
+            k = self._scenario_top_k(len(columns))
+            order = np.argsort(-scores[:, columns], axis=1, kind="stable")[:, :k]
+            top_items = columns[order].tolist()
+            top_scores = np.take_along_axis(scores[:, columns], order, axis=1).tolist()
+            for user_id, row_items, row_scores in zip(user_ids, top_items, top_scores):
+                recommendations[(user_id, scenario)] = [
+                    (items[i], score) for i, score in zip(row_items, row_scores) if score > -np.inf
+                ]
+            popular[scenario] = [
+                (items[i], float(popularity[i])) for i in columns[np.argsort(-popularity[columns], kind="stable")[:k]]
+            ]
+
+        # Publish by swapping whole dicts; readers see either the old or the new lists.
+        # Skip if the corpus changed mid-rebuild; update_corpus() rebuilds again.
+        with self._lock:
+            if items is not self._items:
+                return False
+            self._recommendations = recommendations
+            self._popular = popular
+        self.last_rebuild_ms = (time.perf_counter() - start) * 1000
+        return True
+
+    def _run_worker(self):
+        while True:
+            time.sleep(self.rebuild_interval)
+            try:
+                self.prune()
+                self.rebuild()
+            except Exception:
+                logger.exception("Recommender rebuild failed")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "users": len(self._user_index),
+                "items": len(self._items),
+                "ratings": len(self._ratings),
+                "recommendation_lists": len(self._recommendations),
+                "last_rebuild_ms": self.last_rebuild_ms
+            }
+
+    def footprint(self):
+        """Estimate the bytes held by ratings, per-user bookkeeping and published lists."""
+        with self._lock:
+            parts = {
+                "ratings": dict(self._ratings),
+                "users": (dict(self._user_index), dict(self._last_seen), dict(self._disliked)),
+                "recommendations": self._recommendations
+            }
+        seen = set()
+        components = {name: deep_sizeof(obj, seen) for name, obj in parts.items()}
+        components["total"] = sum(components.values())
+        return components
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure recommender rebuild time and lookup latency.")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--ratings-per-user", type=int, default=5)
+    parser.add_argument("--lookups", type=int, default=100000)
+    args = parser.parse_args()
+
+    corpus = {f"scenario{s}": [f"Excuse {s}-{n}." for n in range(10)] for s in range(4)}
+    recommender = ExcuseRecommender(corpus, rebuild_interval=3600)
+    rng = random.Random(0)
+    items = [excuse for excuses in corpus.values() for excuse in excuses]
+    for user in range(args.users):
+        for excuse in rng.sample(items, args.ratings_per_user):
+            recommender.record(user, excuse, rng.randint(1, 5))
+    recommender.rebuild()
+    print(f"Rebuild: {recommender.last_rebuild_ms:.0f} ms for {args.users} users, {len(items)} excuses")
+    print(f"Footprint: {recommender.footprint()['total'] / 2**20:.1f} MiB")
+
+    queries = [(rng.randrange(args.users), rng.choice(list(corpus))) for _ in range(args.lookups)]
+    start = time.perf_counter()
+    for user, scenario in queries:
+        recommender.recommend(user, scenario)
+    per_lookup_us = (time.perf_counter() - start) / args.lookups * 1e6
+    print(f"Lookup: {per_lookup_us:.2f} µs per top-k request")
@@ -0,0 +1,131 @@
+import argparse
+import logging
+import threading
+import time
+from functools import lru_cache
+from io import BytesIO
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Paragraph
+from PIL import Image, ImageDraw, ImageFont
+from speech import split_segments
+
+# Fonts drawn on the medical certificate; reportlab loads their metrics on first use
+CERTIFICATE_FONTS = ("Helvetica", "Helvetica-Bold", "Helvetica-Oblique")
+CHAT_SIZE = (400, 600)
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def get_paragraph_style(name="Normal"):
+    """Shared reportlab paragraph style; getSampleStyleSheet() rebuilds every style on each call."""
+    return getSampleStyleSheet()[name]
+
+
+@lru_cache(maxsize=None)
+def get_chat_font():
+    """Shared PIL font for chat screenshots; ImageDraw otherwise loads the default per drawing."""
+    return ImageFont.load_default()
+
+
+@lru_cache(maxsize=None)
+def get_chat_template():
+    """Blank chat screenshot. Shared read-only, so callers must draw on a copy()."""
+    return Image.new('RGB', CHAT_SIZE, color='white')
+
+
+def _render_certificate_probe():
+    c = canvas.Canvas(BytesIO(), pagesize=letter)
+    for font in CERTIFICATE_FONTS:
+        c.setFont(font, 12)
+        c.drawString(72, 72, "warm-up")
+    para = Paragraph("warm-up", get_paragraph_style())
+    para.wrapOn(c, 468, 144)
+    para.drawOn(c, 72, 560)
+    c.save()
+
+
+def _render_chat_probe():
+    img = get_chat_template().copy()
+    ImageDraw.Draw(img).text((10, 10), "warm-up", fill='black', font=get_chat_font())
+    img.save(BytesIO(), format="PNG")
+
+
+def warm_speech(speech_cache, snapshot, backend, prefixes=(), lang="en"):
+    """Synthesize every speech segment of a corpus snapshot into the shared cache.
+
+    Runs on a background thread, since the TTS backend may be slow or remote;
+    segments already cached cost only a lookup. At most the cache's max_entries
+    segments are warmed, so a large corpus cannot make each warm-up evict the
+    last one's clips and synthesize them again. Returns the number of segments.
+    """
+    texts = [e for excuses in snapshot.excuses.values() for e in excuses]
+    texts += list(snapshot.apologies.values()) + list(prefixes)
+    segments = list(dict.fromkeys(segment for text in texts for segment in split_segments(text, prefixes)))
+    if len(segments) > speech_cache.max_entries:
+        logger.warning(
+            "Warming %d of %d speech segments; the rest exceed the cache's %d entries",
+            speech_cache.max_entries, len(segments), speech_cache.max_entries
+        )
+        segments = segments[:speech_cache.max_entries]
+
+    def synthesize_all():
+        failures = 0
+        for segment in segments:
+            try:
+                speech_cache.get_or_synthesize(segment, lang, backend)
+            except Exception:
+                failures += 1
+                if failures == 1:
+                    logger.exception("Speech warm-up failed for %r", segment)
+        if failures:
+            logger.warning("Speech warm-up: %d of %d segments failed", failures, len(segments))
+
+    threading.Thread(target=synthesize_all, daemon=True).start()
+    return len(segments)
+
+
+def warm_up(speech_cache=None, snapshot=None, backend=None, prefixes=(), lang="en"):
+    """Build shared assets and run first-use code paths once per process.
+
+    Speech segments for the whole corpus are synthesized in the background
+    with warm_speech(). Returns the time spent on each step in milliseconds.
+    """
+    timings = {}
+    for name, step in (
+        ("stylesheet", get_paragraph_style),
+        ("certificate", _render_certificate_probe),
+        ("chat", _render_chat_probe)
+    ):
+        start = time.perf_counter()
+        step()
+        timings[f"{name}_ms"] = (time.perf_counter() - start) * 1000
+
+    if speech_cache is not None and snapshot is not None and backend is not None:
+        timings["speech_segments"] = warm_speech(speech_cache, snapshot, backend, prefixes, lang)
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare first-use and steady-state proof rendering.")
+    parser.add_argument("--repeats", type=int, default=100)
+    parser.add_argument("--warm", action="store_true", help="Run warm_up() before the first request")
+    args = parser.parse_args()
+
+    if args.warm:
+        start = time.perf_counter()
+        warm_up()
+        print(f"Warm-up: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    def request():
+        start = time.perf_counter()
+        _render_certificate_probe()
+        _render_chat_probe()
+        return (time.perf_counter() - start) * 1000
+
+    first = request()
+    rest = sorted(request() for _ in range(args.repeats - 1))
+    print(f"First request: {first:.1f} ms")
+    print(f"Request #{args.repeats}: median {rest[len(rest) // 2]:.1f} ms")
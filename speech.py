@@ -0,0 +1,285 @@
+import argparse
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+from gtts import gTTS
+
+# Bitrates (kbps) for Layer III, indexed by the 4-bit bitrate field
+MPEG1_BITRATES = [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320]
+MPEG2_BITRATES = [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+
+# Sample rates (Hz) by version bits: 0 = MPEG2.5, 2 = MPEG2, 3 = MPEG1
+SAMPLE_RATES = {
+    0: [11025, 12000, 8000],
+    2: [22050, 24000, 16000],
+    3: [44100, 48000, 32000]
+}
+
+# Longest chunk sent to the backend in one call
+MAX_CHUNK_CHARS = 200
+
+# One silent MPEG2 Layer III frame: 24 kHz, 32 kbps, mono, 24 ms of audio
+SILENT_FRAME = bytes([0xFF, 0xF3, 0x44, 0xC0]) + bytes(92)
+
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+
+
+def gtts_backend(text, lang):
+    """Synthesize text with gTTS and return the MP3 bytes."""
+    fp = BytesIO()
+    gTTS(text=text, lang=lang).write_to_fp(fp)
+    return fp.getvalue()
+
+
+class FakeBackend:
+    """Offline stand-in for gTTS that returns silent MP3 after a configurable delay."""
+
+    def __init__(self, latency=0.2, per_char_latency=0.0, frames_per_char=3):
+        self.latency = latency
+        self.per_char_latency = per_char_latency
+        self.frames_per_char = frames_per_char
+
+    def __call__(self, text, lang):
+        time.sleep(self.latency + self.per_char_latency * len(text))
+        return SILENT_FRAME * max(1, len(text) * self.frames_per_char)
+
+
+def get_backend():
+    """Return the backend selected by SPEECH_BACKEND ("gtts" or "fake")."""
+    if os.environ.get("SPEECH_BACKEND", "gtts") == "fake":
+        return FakeBackend(latency=float(os.environ.get("SPEECH_FAKE_LATENCY", "0.2")))
+    return gtts_backend
+
+
+def _wrap_sentence(sentence, max_chars):
+    """Break an over-long sentence at word boundaries."""
+    while len(sentence) > max_chars:
+        cut = sentence.rfind(" ", 0, max_chars)
+        if cut <= 0:
+            cut = max_chars
+        yield sentence[:cut].strip()
+        sentence = sentence[cut:].strip()
+    if sentence:
+        yield sentence
+
+
+def split_segments(text, prefixes=(), max_chars=MAX_CHUNK_CHARS):
+    """Split text into reusable speech segments (prefix, then sentences)."""
+    text = text.strip()
+    segments = []
+    for prefix in prefixes:
+        if text.startswith(prefix):
+            segments.append(prefix.strip())
+            text = text[len(prefix):]
+            break
+    for sentence in _SENTENCE_BREAK.split(text):
+        segments.extend(_wrap_sentence(sentence.strip(), max_chars))
+    return segments
+
+
+def _frame_length(header):
+    """Return the byte length of the Layer III frame starting with header, or None."""
+    if header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+    version = (header[1] >> 3) & 0x03
+    layer = (header[1] >> 1) & 0x03
+    bitrate_index = (header[2] >> 4) & 0x0F
+    rate_index = (header[2] >> 2) & 0x03
+    padding = (header[2] >> 1) & 0x01
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    sample_rate = SAMPLE_RATES[version][rate_index]
+    if version == 3:
+        return 144000 * MPEG1_BITRATES[bitrate_index] // sample_rate + padding
+    return 72000 * MPEG2_BITRATES[bitrate_index] // sample_rate + padding
+
+
+def iter_mp3_frames(data):
+    """Yield the raw MPEG audio frames of an MP3 clip, skipping ID3 tags."""
+    pos = 0
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        pos = 10 + size + (10 if data[5] & 0x10 else 0)
+    end = len(data) - 128 if data[-128:-125] == b"TAG" else len(data)
+    while pos + 4 <= end:
+        length = _frame_length(data[pos:pos + 4])
+        if length is None or pos + length > end:
+            pos += 1  # Resync on the next byte
+            continue
+        yield data[pos:pos + length]
+        pos += length
+
+
+def _is_info_frame(frame):
+    """Return True for Xing/Info/VBRI header frames, which carry no audio."""
+    head = frame[:64]
+    return b"Xing" in head or b"Info" in head or b"VBRI" in head
+
+
+def splice_mp3(clips):
+    """Concatenate MP3 clips at the frame level without re-encoding."""
+    frames = []
+    for clip in clips:
+        for index, frame in enumerate(iter_mp3_frames(clip)):
+            if index == 0 and _is_info_frame(frame):
+                continue
+            frames.append(frame)
+    return b"".join(frames)
+
+
+class SegmentCache:
+    """Process-wide LRU cache of synthesized speech segments.
+
+    Concurrent misses on the same segment share one backend call: the first
+    caller synthesizes, the others wait on its pending future.
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._pending = {}  # key -> Future for segments being synthesized
+        self._lock = threading.Lock()
+
+    def get_or_synthesize(self, segment, lang, backend):
+        """Return cached audio for a segment, calling the backend on a miss."""
+        key = (lang, segment)
+        with self._lock:
+            audio = self._entries.get(key)
+            if audio is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return audio
+            pending = self._pending.get(key)
+            if pending is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                self._pending[key] = Future()
+        if pending is not None:
+            return pending.result()
+        try:
+            audio = backend(segment, lang)
+        except BaseException as e:
+            with self._lock:
+                future = self._pending.pop(key)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._entries[key] = audio
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            future = self._pending.pop(key)
+        future.set_result(audio)
+        return audio
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        """Return cache counters for reporting."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(len(audio) for audio in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hit_rate
+            }
+
+
+def iter_speech_chunks(segments, lang, cache, backend=gtts_backend, max_workers=4):
+    """Synthesize segments on a worker pool and yield their audio in order as each is ready.
+
+    Repeated segments are submitted once and their audio is yielded at every position.
+    """
+    if not segments:
+        return
+    unique = list(dict.fromkeys(segments))
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(unique))) as pool:
+        futures = {segment: pool.submit(cache.get_or_synthesize, segment, lang, backend) for segment in unique}
+        try:
+            for segment in segments:
+                yield futures[segment].result()
+        finally:
+            for future in futures.values():
+                future.cancel()
+
+
+def synthesize_speech(text, lang, cache, backend=gtts_backend, prefixes=(), max_workers=4, on_chunk=None):
+    """Synthesize text chunk by chunk through the cache and splice the result.
+
+    on_chunk(index, audio) is called as soon as each chunk is ready, in order,
+    so callers can start playback before the whole text is synthesized.
+    """
+    start = time.perf_counter()
+    segments = split_segments(text, prefixes)
+    backend_calls = []
+
+    def counting_backend(segment, segment_lang):
+        backend_calls.append(segment)
+        return backend(segment, segment_lang)
+
+    clips = []
+    first_audio_ms = None
+    for index, clip in enumerate(iter_speech_chunks(segments, lang, cache, counting_backend, max_workers)):
+        if first_audio_ms is None:
+            first_audio_ms = (time.perf_counter() - start) * 1000
+        clips.append(clip)
+        if on_chunk is not None:
+            on_chunk(index, clip)
+    assembly_start = time.perf_counter()
+    audio = splice_mp3(clips)
+    assembly_ms = (time.perf_counter() - assembly_start) * 1000
+    stats = {
+        "segments": len(segments),
+        "backend_calls": len(backend_calls),
+        "request_hit_rate": 1 - len(backend_calls) / len(segments) if segments else 0.0,
+        "cache_hit_rate": cache.hit_rate,
+        "first_audio_ms": first_audio_ms,
+        "total_ms": (time.perf_counter() - start) * 1000,
+        "assembly_ms": assembly_ms
+    }
+    return audio, stats
+
+
+def measure_time_to_first_audio(text, backend, max_workers=4):
+    """Compare time-to-first-audio of whole-text synthesis against chunked synthesis."""
+    start = time.perf_counter()
+    backend(text, "en")
+    whole_ms = (time.perf_counter() - start) * 1000
+    results = {"whole_text_ms": whole_ms}
+    for workers in (1, max_workers):
+        _, stats = synthesize_speech(text, "en", SegmentCache(), backend, max_workers=workers)
+        results[f"workers_{workers}"] = stats
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure speech time-to-first-audio with an offline backend.")
+    parser.add_argument("--latency", type=float, default=0.3, help="Fixed backend latency per call (s)")
+    parser.add_argument("--per-char", type=float, default=0.002, help="Backend latency per character (s)")
+    parser.add_argument("--workers", type=int, default=4, help="Synthesis worker pool size")
+    parser.add_argument("--sentences", type=int, default=8, help="Sentences in the sample text")
+    args = parser.parse_args()
+
+    sample = " ".join(
+        f"This is sentence number {n} of a long custom excuse that needs to be read aloud." for n in range(1, args.sentences + 1)
+    )
+    results = measure_time_to_first_audio(sample, FakeBackend(args.latency, args.per_char), args.workers)
+    print(f"Text length: {len(sample)} chars")
+    print(f"Whole text:  first audio {results['whole_text_ms']:.0f} ms")
+    for workers in (1, args.workers):
+        stats = results[f"workers_{workers}"]
+        print(
+            f"Chunked x{workers}: first audio {stats['first_audio_ms']:.0f} ms, "
+            f"total {stats['total_ms']:.0f} ms, {stats['segments']} chunks, "
+            f"assembly {stats['assembly_ms']:.2f} ms"
+        )